@@ -1,16 +1,22 @@
+import hashlib
+import json
+import os
+import numpy as np
 import polars as pl
 import statsmodels.api as sm
 
 class FactorDetrending:
-    def __init__(self, column_to_clean, reference_column):
+    def __init__(self, column_to_clean, reference_column, universe=None):
         """
         Initialize the FactorDetrending class.
 
         :param column_to_clean: Name of the column to perform de-stylization on (e.g., the factor column).
         :param reference_column: Name of the column to use as the reference (e.g., close prices).
+        :param universe: Optional SymbolUniverse; if given, only eligible symbols of each time slice are processed.
         """
         self.column_to_clean = column_to_clean
         self.reference_column = reference_column
+        self.universe = universe
 
     def remove_outliers(self, group):
         """
@@ -64,6 +70,247 @@ class FactorDetrending:
         :param all_data: Input DataFrame containing the data to process.
         :return: A DataFrame with the processed residuals.
         """
+        if self.universe is not None:
+            all_data = self.universe.filter(all_data)
         all_data_clean = all_data.groupby('open_time').apply(self.remove_outliers)
         residuals_df = all_data_clean.groupby('open_time').apply(self.orthogonalize)
-        return residuals_df
\ No newline at end of file
+        return residuals_df
+
+class BatchFactorDetrending:
+    def __init__(self, columns_to_clean, reference_columns=("close", "quote_volume", "return"), cache_dir=None, universe=None):
+        """
+        Initialize the BatchFactorDetrending class, which de-stylizes many factors against a shared set of style exposures.
+
+        :param columns_to_clean: Names of the factor columns to perform de-stylization on.
+        :param reference_columns: Names of the style columns every factor is regressed on.
+        :param cache_dir: Optional directory where residuals are cached per (factor, style set, input data).
+        :param universe: Optional SymbolUniverse; if given, only eligible symbols of each time slice are processed.
+        """
+        self.columns_to_clean = list(columns_to_clean)
+        self.reference_columns = list(reference_columns)
+        self.cache_dir = cache_dir
+        self.universe = universe
+
+    def prepare(self, all_data):
+        """
+        Restrict the data to the universe, drop rows with missing style exposures and sort it by time and symbol.
+
+        :param all_data: Input DataFrame containing the factor and style columns.
+        :return: The prepared DataFrame.
+        """
+        if self.universe is not None:
+            all_data = self.universe.filter(all_data)
+        return all_data.drop_nulls(self.reference_columns).sort(['open_time', 'symbol'])
+
+    def universe_key(self):
+        """
+        Describe the universe settings so that they become part of the cache key.
+
+        :return: A string identifying the universe, or 'all' without a universe.
+        """
+        if self.universe is None:
+            return 'all'
+        u = self.universe
+        return f'top{u.top_n}-w{u.window}-qv{u.min_quote_volume}-age{u.min_listing_age}'
+
+    def cache_name(self, column):
+        """
+        Name identifying the residuals of one factor against the style set, used as the manifest key.
+
+        :param column: Name of the factor column.
+        :return: A string of the form '<factor>__<sorted style columns>'.
+        """
+        return f"{column}__{'-'.join(sorted(self.reference_columns))}"
+
+    def data_fingerprint(self, prepared_data):
+        """
+        Hash the keys and style exposures of the prepared input together with the universe settings.
+        It is computed once per run and shared by every factor.
+
+        :param prepared_data: The DataFrame returned by prepare.
+        :return: A hashlib digest object that cache_path extends with each factor column.
+        """
+        digest = hashlib.sha256()
+        digest.update(self.universe_key().encode('utf-8'))
+        digest.update(str(prepared_data.height).encode('utf-8'))
+        digest.update(prepared_data.select(['open_time', 'symbol'] + self.reference_columns).hash_rows(seed=0).to_numpy().tobytes())
+        return digest
+
+    def cache_path(self, prepared_data, column, fingerprint):
+        """
+        Path of the cached residuals of one factor. The file name contains a fingerprint of the
+        prepared input rows (keys, style exposures and the factor itself) and of the universe settings,
+        so residuals computed from other data or another universe are never picked up.
+
+        :param prepared_data: The DataFrame returned by prepare.
+        :param column: Name of the factor column.
+        :param fingerprint: The digest returned by data_fingerprint.
+        :return: Path of the parquet file.
+        """
+        digest = fingerprint.copy()
+        digest.update(prepared_data[column].hash(seed=0).to_numpy().tobytes())
+        return os.path.join(self.cache_dir, f"{self.cache_name(column)}__{digest.hexdigest()[:16]}.parquet")
+
+    def read_manifest(self):
+        """
+        Read the manifest of cache_dir, which maps each (factor, style set) to its latest residual file.
+
+        :return: A dict from cache_name to file name.
+        """
+        manifest_path = os.path.join(self.cache_dir, 'manifest.json')
+        if not os.path.exists(manifest_path):
+            return {}
+        with open(manifest_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def record_cache(self, column, path):
+        """
+        Point the manifest entry of one factor at a newly written residual file and delete the file it supersedes.
+
+        :param column: Name of the factor column.
+        :param path: Path of the new residual file.
+        """
+        manifest = self.read_manifest()
+        previous = manifest.get(self.cache_name(column))
+        manifest[self.cache_name(column)] = os.path.basename(path)
+
+        manifest_path = os.path.join(self.cache_dir, 'manifest.json')
+        tmp_path = f'{manifest_path}.tmp.{os.getpid()}'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, manifest_path)
+
+        if previous is not None and previous != os.path.basename(path):
+            previous_path = os.path.join(self.cache_dir, previous)
+            if os.path.exists(previous_path):
+                os.remove(previous_path)
+
+    def load_residuals(self, column):
+        """
+        Load the latest cached residuals of one factor against the style set, without needing the input data.
+        This is how later correlation and backtest runs pick up the residuals.
+
+        :param column: Name of the factor column.
+        :return: A DataFrame with open_time, symbol and the residual column, or None if nothing is cached.
+        """
+        if self.cache_dir is None:
+            return None
+        name = self.read_manifest().get(self.cache_name(column))
+        if name is None or not os.path.exists(os.path.join(self.cache_dir, name)):
+            return None
+        return pl.read_parquet(os.path.join(self.cache_dir, name))
+
+    def remove_outliers_batch(self, all_data, columns):
+        """
+        Clip outliers of several columns at once using MAD, per time slice.
+
+        :param all_data: Input DataFrame containing the data to process.
+        :param columns: Names of the columns to clip.
+        :return: The DataFrame with outliers replaced by the boundary values.
+        """
+        # The median is stored first, as a window expression may not be nested inside the MAD aggregation
+        all_data = all_data.with_columns([
+            pl.col(column).median().over('open_time').alias(f'__{column}_median') for column in columns
+        ])
+        all_data = all_data.with_columns([
+            (pl.col(column) - pl.col(f'__{column}_median')).abs().median().over('open_time').alias(f'__{column}_mad')
+            for column in columns
+        ])
+
+        expressions = []
+        for column in columns:
+            lower_bound = pl.col(f'__{column}_median') - 5 * pl.col(f'__{column}_mad')
+            upper_bound = pl.col(f'__{column}_median') + 5 * pl.col(f'__{column}_mad')
+            expressions.append(
+                pl.when(pl.col(column) < lower_bound).then(lower_bound)
+                .when(pl.col(column) > upper_bound).then(upper_bound)
+                .otherwise(pl.col(column)).alias(column)
+            )
+        all_data = all_data.with_columns(expressions)
+        return all_data.drop([f'__{column}_{suffix}' for column in columns for suffix in ('median', 'mad')])
+
+    def orthogonalize_batch(self, group, columns):
+        """
+        Regress several factor columns on the style columns of one time slice,
+        factorizing the style design matrix only once.
+
+        :param group: A DataFrame group for a single time slice.
+        :param columns: Names of the factor columns.
+        :return: A (rows x factors) array of residuals, NaN where they cannot be computed.
+        """
+        X = np.column_stack([np.ones(len(group)), group.select(self.reference_columns).cast(pl.Float64).to_numpy()])
+        Y = group.select(columns).cast(pl.Float64).to_numpy()
+        residuals = np.full(Y.shape, np.nan)
+
+        rows = np.isfinite(X).all(axis=1)
+        X, Y = X[rows], Y[rows]
+        if len(X) == 0:
+            return residuals
+
+        # The SVD of the design matrix is shared by every factor without missing values
+        U, s, _ = np.linalg.svd(X, full_matrices=False)
+        U = U[:, s > s.max() * max(X.shape) * np.finfo(float).eps]
+        complete = np.isfinite(Y).all(axis=0)
+        block = np.full(Y.shape, np.nan)
+        block[:, complete] = Y[:, complete] - U @ (U.T @ Y[:, complete])
+
+        # Factors with missing values are regressed on their own valid rows
+        for k in np.nonzero(~complete)[0]:
+            valid = np.isfinite(Y[:, k])
+            if valid.any():
+                coef = np.linalg.lstsq(X[valid], Y[valid, k], rcond=None)[0]
+                block[valid, k] = Y[valid, k] - X[valid] @ coef
+
+        residuals[rows] = block
+        return residuals
+
+    def process(self, all_data, overwrite=False):
+        """
+        Execute outlier removal and orthogonalization for all factor columns.
+        Factors whose residuals are already cached for the same input data are loaded instead of recomputed.
+
+        :param all_data: Input DataFrame containing the factor and style columns.
+        :param overwrite: Recompute and overwrite cached residuals.
+        :return: A DataFrame with open_time, symbol and one residual column per factor.
+        """
+        all_data = self.prepare(all_data)
+
+        cached = {}
+        paths = {}
+        if self.cache_dir is not None:
+            # The fingerprint is taken on the data before clipping, for both lookup and writing
+            fingerprint = self.data_fingerprint(all_data)
+            paths = {column: self.cache_path(all_data, column, fingerprint) for column in self.columns_to_clean}
+            if not overwrite:
+                for column, path in paths.items():
+                    if os.path.exists(path):
+                        cached[column] = pl.read_parquet(path)
+        missing = [column for column in self.columns_to_clean if column not in cached]
+
+        if missing:
+            clean_data = self.remove_outliers_batch(all_data, missing)
+
+            # Groups keep the sorted row order, so residuals line up with the key columns
+            groups = clean_data.partition_by('open_time', maintain_order=True)
+            residuals = np.vstack([self.orthogonalize_batch(group, missing) for group in groups] + [np.empty((0, len(missing)))])
+            keys = clean_data.select(['open_time', 'symbol'])
+
+            if self.cache_dir is not None:
+                os.makedirs(self.cache_dir, exist_ok=True)
+            for k, column in enumerate(missing):
+                cached[column] = keys.with_columns(
+                    pl.Series(f'{column}_residuals', residuals[:, k]).fill_nan(None)
+                )
+                if self.cache_dir is not None:
+                    tmp_path = f'{paths[column]}.tmp.{os.getpid()}'
+                    cached[column].write_parquet(tmp_path)
+                    os.replace(tmp_path, paths[column])
+                    self.record_cache(column, paths[column])
+
+        residuals_df = None
+        for column in self.columns_to_clean:
+            if residuals_df is None:
+                residuals_df = cached[column]
+            else:
+                residuals_df = residuals_df.join(cached[column], on=['open_time', 'symbol'], how='inner')
+        return residuals_df
@@ -4,14 +4,17 @@ from scipy.stats import spearmanr, kendalltau
 from minepy import MINE
 
 class FactorCorrelation:
-    def __init__(self, factors_dict):
+    def __init__(self, factors_dict, universe=None):
         """
         初始化方法
         :param factors_dict: 包含所有因子的字典，键为因子名称，值为因子数据的DataFrame
+        :param universe: 可选，标的池（SymbolUniverse），指定后只保留每个时间截面的可交易标的
         """
         self.factors_dict = factors_dict
         self.factor_names = list(factors_dict.keys())
+        self.universe = universe
         self.aligned_factors = self.align_factors()
+        self.rolling_correlations = {}
     
     def align_factors(self):
         """
@@ -26,6 +29,8 @@ class FactorCorrelation:
                 aligned_factors = df
             else:
                 aligned_factors = aligned_factors.join(df, on=["open_time", "symbol"], how="inner")
+        if self.universe is not None:
+            aligned_factors = self.universe.filter(aligned_factors)
         return aligned_factors
     
     def compute_correlation_per_time(self, correlation_func):
@@ -34,21 +39,97 @@ class FactorCorrelation:
         :param correlation_func: 相关性计算函数（Spearman, Kendall, etc.）
         :return: 所有时间截面相关性的均值
         """
-        time_points = self.aligned_factors["open_time"].unique().to_list()  # 获取所有时间点
-        correlations = []
-
-        for time in time_points:
-            # 获取当前时间点的所有数据
-            time_data = self.aligned_factors.filter(pl.col("open_time") == time)
-            
-            # 计算当前时间点的相关性矩阵
-            correlation_matrix = correlation_func(time_data)
-            correlations.append(correlation_matrix)
+        _, correlations = self.compute_correlation_series(correlation_func)
 
         # 计算所有时间截面上相关性的均值
         mean_correlations = np.nanmean(correlations, axis=0)
         return mean_correlations
 
+    def compute_correlation_series(self, correlation_func):
+        """
+        按时间截面计算相关性矩阵，返回按时间排序的矩阵序列
+        :param correlation_func: 相关性计算函数（Spearman, Kendall, etc.）
+        :return: (时间点列表, 形状为 (时间 × n × n) 的相关性矩阵数组)
+        """
+        # 按时间排序后一次性切分，避免对每个时间点重复 filter 全表
+        time_slices = self.aligned_factors.sort("open_time").partition_by("open_time", maintain_order=True)
+        time_points = []
+        correlations = []
+
+        for time_data in time_slices:
+            time_points.append(time_data["open_time"][0])
+            # 计算当前时间点的相关性矩阵
+            correlations.append(correlation_func(time_data))
+
+        n = len(self.factor_names)
+        return time_points, np.array(correlations).reshape(len(time_points), n, n)
+
+    def compute_rolling_correlation(self, correlation_func, window=720, min_periods=None):
+        """
+        计算滚动窗口内的截面相关性均值，窗口滑动时增量更新窗口内的求和与计数
+        :param correlation_func: 相关性计算函数（Spearman, Kendall, etc.）
+        :param window: 窗口长度（时间截面个数），例如小时频数据的 720 即过去 30 天
+        :param min_periods: 窗口内有效截面数少于该值时结果为 NaN，默认为 window，即窗口填满前不输出
+        :return: (时间点列表, 形状为 (时间 × n × n) 的滚动相关性矩阵数组)
+        """
+        if min_periods is None:
+            min_periods = window
+        if window <= 0:
+            raise ValueError(f"窗口长度必须为正整数，当前为 {window}")
+        if not 1 <= min_periods <= window:
+            raise ValueError(f"min_periods 必须在 1 到窗口长度 {window} 之间，当前为 {min_periods}")
+
+        time_points, correlations = self.compute_correlation_series(correlation_func)
+        n = len(self.factor_names)
+
+        valid = ~np.isnan(correlations)
+        values = np.where(valid, correlations, 0.0)
+
+        window_sum = np.zeros((n, n))
+        window_count = np.zeros((n, n), dtype=np.int64)
+        rolling = np.full((len(time_points), n, n), np.nan, dtype=np.float32)
+
+        for t in range(len(time_points)):
+            # 新截面进入窗口
+            window_sum += values[t]
+            window_count += valid[t]
+
+            # 最旧的截面离开窗口
+            if t >= window:
+                window_sum -= values[t - window]
+                window_count -= valid[t - window]
+
+            enough = window_count >= min_periods
+            rolling[t][enough] = window_sum[enough] / window_count[enough]
+
+        return time_points, rolling
+
+    def find_threshold_crossings(self, time_points, rolling, threshold, absolute=True):
+        """
+        查找滚动相关性穿越阈值的因子对
+        :param time_points: compute_rolling_correlation 返回的时间点列表
+        :param rolling: compute_rolling_correlation 返回的 (时间 × n × n) 相关性数组
+        :param threshold: 阈值
+        :param absolute: 是否以相关性的绝对值与阈值比较
+        :return: 包含穿越时间、因子对、相关性和穿越方向（"up" / "down"）的DataFrame
+        """
+        values = np.abs(rolling) if absolute else rolling
+        # NaN 比较结果为 False，与前一时刻的状态不同才视为穿越
+        above = values >= threshold
+        observed = ~np.isnan(values)
+        crossed = (above[1:] != above[:-1]) & observed[1:] & observed[:-1]
+
+        t_idx, i_idx, j_idx = np.nonzero(crossed)
+        t_idx = t_idx + 1
+
+        return pl.DataFrame({
+            "open_time": [time_points[t] for t in t_idx],
+            "factor_i": [self.factor_names[i] for i in i_idx],
+            "factor_j": [self.factor_names[j] for j in j_idx],
+            "correlation": rolling[t_idx, i_idx, j_idx].astype(np.float64),
+            "direction": ["up" if above[t, i, j] else "down" for t, i, j in zip(t_idx, i_idx, j_idx)]
+        })
+
     def compute_spearman(self, time_data=None):
         """
         计算Spearman相关性矩阵，支持按时间截面计算
@@ -123,10 +204,12 @@ class FactorCorrelation:
 
         return mine_matrix
 
-    def compute_all(self, correlations=["spearman", "kendall", "mine"]):
+    def compute_all(self, correlations=["spearman", "kendall", "mine"], window=None, min_periods=None):
         """
         计算所有相关性并打印结果，按时间截面计算后取均值
         :param correlations: 选择需要计算和打印的相关系数，可以为("spearman", "kendall", "mine")的任意组合
+        :param window: 可选，滚动窗口长度；指定后计算滚动相关性矩阵序列，存入 self.rolling_correlations 并打印最新窗口的矩阵
+        :param min_periods: 滚动模式下窗口内最少的有效截面数，默认为 window
         """
         correlation_mapping = {
             "spearman": self.compute_spearman,
@@ -136,9 +219,18 @@ class FactorCorrelation:
 
         for corr in correlations:
             if corr in correlation_mapping:
-                mean_corr = self.compute_correlation_per_time(correlation_mapping[corr])
-                print(f"\n{corr.capitalize()}相关性均值：")
-                print(mean_corr)
+                if window is None:
+                    mean_corr = self.compute_correlation_per_time(correlation_mapping[corr])
+                    print(f"\n{corr.capitalize()}相关性均值：")
+                    print(mean_corr)
+                else:
+                    time_points, rolling = self.compute_rolling_correlation(correlation_mapping[corr], window, min_periods)
+                    self.rolling_correlations[corr] = (time_points, rolling)
+                    if len(time_points) == 0:
+                        print(f"\n{corr.capitalize()}滚动相关性：没有可用的时间截面")
+                        continue
+                    print(f"\n{corr.capitalize()}滚动相关性（窗口 {window}，截至 {time_points[-1]}）：")
+                    print(rolling[-1])
     
     def split(self, date_time):
         """
@@ -14,7 +14,7 @@ class FactorAnalysis:
         "bench_long_cum", "short_long_cum", "short_bench_cum", "bench_short_cum"
     ] + [f"quantile_{i}" for i in range(11)] + ["in_range", "range_return"] + [f"ret_sum_avg_{i+1}" for i in range(10)] + [f"group_diff_return_{i}" for i in range(10)]
 
-    def __init__(self, factors, result_hour, commission=0.25 / 10000.0):
+    def __init__(self, factors, result_hour, commission=0.25 / 10000.0, universe=None):
         """
         初始化因子分析类
 
@@ -22,10 +22,12 @@ class FactorAnalysis:
         factors (DataFrame): 因子数据
         result_hour (DataFrame): 每小时的结果数据
         commission (float): 交易佣金比例，默认为0.25个基点
+        universe (SymbolUniverse): 可选，标的池，指定后只在每个时间截面的可交易标的上回测
         """
         self.factors = factors
         self.result_hour = result_hour
         self.commission = commission
+        self.universe = universe
         self.processed_factors = None
         self.ans_df = None
         self.result_df = None
@@ -50,6 +52,10 @@ class FactorAnalysis:
         # 将参考收益率与因子数据合并
         self.factors = self.factors.join(ret, on=["symbol", "open_time"], how="inner").sort("open_time")
 
+        # 收益率需在全部标的上计算，之后再限制到标的池内
+        if self.universe is not None:
+            self.factors = self.universe.filter(self.factors)
+
     def calculate_quantiles(self):
         """
         计算因子的分位数并生成新列
@@ -159,16 +165,33 @@ class FactorAnalysis:
         n (int): 每年的时间单位数
         S (Series): 收益率数据
         """
+        stats = self.compute_stats(n, pnl)
+
+        print("ann_return =", round(stats["ann_return"], 4), end='  ')
+        print("sharpe =", round(stats["sharpe"], 4), end='  ')
+        print("maxdd =", round(stats["maxdd"], 4), end='  ')
+        print("calmar_ratio =", round(stats["calmar_ratio"], 4), end='  ')
+
+    def compute_stats(self, n, pnl):
+        """
+        计算因子的统计指标
+
+        参数:
+        n (int): 每年的时间单位数
+        pnl (Series): 收益率数据
+
+        返回:
+        dict: 年化收益、夏普比率、最大回撤和卡玛比率，分母为0时对应比率为 NaN
+        """
         net_value = pnl.cum_sum() + 1.0
-        sharpe = n ** 0.5 * pnl.mean() / pnl.std()
+        std = pnl.std()
         ann_return = n * pnl.mean()
         maxdd = (-(net_value / net_value.cum_max() - 1)).max()
-        calmar_ratio = ann_return / maxdd
+        # 收益率恒定或没有回撤时比率无定义，记为 NaN
+        sharpe = n ** 0.5 * pnl.mean() / std if std else float("nan")
+        calmar_ratio = ann_return / maxdd if maxdd else float("nan")
 
-        print("ann_return =", round(ann_return, 4), end='  ')
-        print("sharpe =", round(sharpe, 4), end='  ')
-        print("maxdd =", round(maxdd, 4), end='  ')
-        print("calmar_ratio =", round(calmar_ratio, 4), end='  ')
+        return {"ann_return": ann_return, "sharpe": sharpe, "maxdd": maxdd, "calmar_ratio": calmar_ratio}
 
     def calculate_factor_stats(self):
         """
@@ -327,6 +350,30 @@ class FactorAnalysis:
             self.factor_stats(n, pl.Series(self.result_df[f"group_diff_return_{i}"]))
             print("\n")
 
+    def collect_metrics(self, n=365 * 24):
+        """
+        运行不含绘图和打印的分析流程，返回各策略及10组分位数的统计指标，供批量运行使用
+
+        参数:
+        n (int): 每年的时间单位数，默认为小时频
+
+        返回:
+        dict: 键为策略名称，值为 compute_stats 返回的统计指标
+        """
+        self.preprocess_data()
+        self.calculate_quantiles()
+        self.calculate_returns()
+        self.calculate_10_group_returns()
+
+        metrics = {}
+        for name in ["long_fee", "short_fee", "bench_fee", "long_short", "long_bench",
+                     "bench_long", "short_long", "short_bench", "bench_short"]:
+            metrics[name] = self.compute_stats(n, self.ans_df[name])
+        for i in range(1, 11):
+            metrics[f"group_{i}"] = self.compute_stats(n, self.result_df[f"ret_sum_avg_{i}"])
+            metrics[f"group_difference_{i}"] = self.compute_stats(n, self.result_df[f"group_diff_return_{i}"])
+        return metrics
+
     def run_full_analysis(self):
         """
         运行完整的分析流程
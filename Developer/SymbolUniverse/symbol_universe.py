@@ -0,0 +1,114 @@
+import inspect
+import polars as pl
+import numpy as np
+
+# rolling_mean 的最少样本数参数在 polars 1.0 之后由 min_periods 改名为 min_samples，且只能以关键字传入
+_MIN_SAMPLES_ARG = "min_samples" if "min_samples" in inspect.signature(pl.Expr.rolling_mean).parameters else "min_periods"
+
+class SymbolUniverse:
+    def __init__(self, result_hour, top_n=100, window=720, min_quote_volume=0.0, min_listing_age=720):
+        """
+        初始化方法，根据滚动成交额和上市时长预先计算每个时间截面的可交易标的
+        :param result_hour: 行情数据的DataFrame，需包含 open_time、symbol 和 quote_volume 列
+        :param top_n: 每个时间截面保留滚动成交额最大的前 top_n 个标的，为None时不限制数量
+        :param window: 计算滚动平均成交额的窗口长度（时间截面个数）
+        :param min_quote_volume: 滚动平均成交额的下限
+        :param min_listing_age: 上市时长下限，即标的自首次出现以来经过的时间截面个数；数据起始时已存在的标的不受此限制
+        """
+        self.top_n = top_n
+        self.window = window
+        self.min_quote_volume = min_quote_volume
+        self.min_listing_age = min_listing_age
+        self.times = None
+        self.symbols = None
+        self.bitmap = None
+        self._eligible_pairs = None
+        self.build(result_hour)
+
+    def build(self, result_hour):
+        """
+        计算可交易标的并存为位图，每个时间截面一行，每个标的占一个比特
+        :param result_hour: 行情数据的DataFrame
+        """
+        data = result_hour.select(["open_time", "symbol", "quote_volume"]).sort(["symbol", "open_time"])
+        data = data.with_columns([
+            # 最少样本数设为1，上市时长只由 min_listing_age 控制
+            pl.col("quote_volume").rolling_mean(self.window, **{_MIN_SAMPLES_ARG: 1}).over("symbol").alias("rolling_quote_volume"),
+            # 全体数据中的时间截面序号，按时间而非标的自身的行数计算上市时长，数据缺口不会推迟上市时长
+            pl.col("open_time").rank("dense").alias("time_rank")
+        ])
+        data = data.with_columns(pl.col("time_rank").min().over("symbol").alias("first_time_rank"))
+        data = data.with_columns((pl.col("time_rank") - pl.col("first_time_rank") + 1).alias("listing_age"))
+
+        eligible = data.filter(
+            pl.col("rolling_quote_volume").is_not_null()
+            & (pl.col("rolling_quote_volume") >= self.min_quote_volume)
+            # 数据起始时已在交易的标的无法得知真实上市时间，视为已满足上市时长
+            & ((pl.col("first_time_rank") == 1) | (pl.col("listing_age") >= self.min_listing_age))
+        )
+        # 在满足条件的标的中按滚动成交额取前 top_n
+        if self.top_n is not None:
+            eligible = eligible.filter(
+                pl.col("rolling_quote_volume").rank("ordinal", descending=True).over("open_time") <= self.top_n
+            )
+
+        self.times = data["open_time"].unique().sort()
+        self.symbols = data["symbol"].unique().sort()
+        time_index, symbol_index = self.index_frames()
+
+        eligible = eligible.select(["open_time", "symbol"]).join(time_index, on="open_time", how="inner")
+        eligible = eligible.join(symbol_index, on="symbol", how="inner")
+
+        mask = np.zeros((len(self.times), len(self.symbols)), dtype=bool)
+        mask[eligible["time_idx"].to_numpy(), eligible["symbol_idx"].to_numpy()] = True
+        self.bitmap = np.packbits(mask, axis=1)
+        self._eligible_pairs = None
+
+    def index_frames(self):
+        """
+        生成时间点和标的到位图行、列下标的映射表
+        :return: (open_time 与 time_idx 的映射表, symbol 与 symbol_idx 的映射表)
+        """
+        time_index = pl.DataFrame({"open_time": self.times, "time_idx": np.arange(len(self.times), dtype=np.uint32)})
+        symbol_index = pl.DataFrame({"symbol": self.symbols, "symbol_idx": np.arange(len(self.symbols), dtype=np.uint32)})
+        return time_index, symbol_index
+
+    def mask(self):
+        """
+        将位图展开为布尔矩阵
+        :return: 形状为 (时间 × 标的) 的布尔矩阵
+        """
+        return np.unpackbits(self.bitmap, axis=1, count=len(self.symbols)).astype(bool)
+
+    def symbols_at(self, open_time):
+        """
+        查询某个时间截面的可交易标的
+        :param open_time: 时间点
+        :return: 标的名称列表
+        """
+        t = self.times.search_sorted(open_time)
+        if t >= len(self.times) or self.times[t] != open_time:
+            return []
+        row = np.unpackbits(self.bitmap[t], count=len(self.symbols)).astype(bool)
+        return [self.symbols[int(s)] for s in np.nonzero(row)[0]]
+
+    def eligible_pairs(self):
+        """
+        由位图生成 (open_time, symbol) 可交易对，结果会被缓存
+        :return: 包含 open_time 和 symbol 两列的DataFrame
+        """
+        if self._eligible_pairs is None:
+            t_idx, s_idx = np.nonzero(self.mask())
+            time_index, symbol_index = self.index_frames()
+            pairs = pl.DataFrame({"time_idx": t_idx.astype(np.uint32), "symbol_idx": s_idx.astype(np.uint32)})
+            pairs = pairs.join(time_index, on="time_idx", how="inner").join(symbol_index, on="symbol_idx", how="inner")
+            self._eligible_pairs = pairs.select(["open_time", "symbol"])
+        return self._eligible_pairs
+
+    def filter(self, df):
+        """
+        以半连接的方式将数据限制在可交易标的范围内
+        :param df: 包含 open_time 和 symbol 列的DataFrame
+        :return: 只保留可交易 (open_time, symbol) 的DataFrame
+        """
+        return df.join(self.eligible_pairs(), on=["open_time", "symbol"], how="semi")
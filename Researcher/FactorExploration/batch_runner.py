@@ -0,0 +1,254 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import polars as pl
+
+BACKTEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "Developer", "SingleFactorBacktest")
+sys.path.insert(0, BACKTEST_DIR)
+
+from factor_analysis import FactorAnalysis
+
+# 每个进程只加载一次的行情数据
+_market_data = None
+
+# 汇总结果的列及类型，没有因子完成时也按此写出空表
+SUMMARY_SCHEMA = {
+    "notebook": pl.Utf8, "factor": pl.Utf8, "strategy": pl.Utf8,
+    "ann_return": pl.Float64, "sharpe": pl.Float64, "maxdd": pl.Float64, "calmar_ratio": pl.Float64
+}
+
+
+def file_hash(path):
+    """
+    计算文件内容的哈希值
+
+    参数:
+    path (str): 文件路径
+
+    返回:
+    str: sha256 十六进制摘要
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """
+    将若干字符串拼接后计算哈希，作为缓存键
+    """
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode("utf-8")).hexdigest()
+
+
+def atomic_write(path, write):
+    """
+    先写入临时文件再替换到目标路径，避免进程中断留下不完整的缓存文件
+
+    参数:
+    path (str): 目标路径
+    write (callable): 接收临时文件路径并写入内容的函数
+    """
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _write_json(path, obj):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(obj, f)
+
+
+def _is_call_to(node, name):
+    """
+    判断节点是否为对 name 的函数调用（支持 name(...) 和 xxx.name(...)）
+    """
+    if not isinstance(node, ast.Call):
+        return False
+    func = node.func
+    return (isinstance(func, ast.Name) and func.id == name) or (isinstance(func, ast.Attribute) and func.attr == name)
+
+
+def extract_factor_code(notebook_path):
+    """
+    从研究 notebook 中提取因子定义代码
+    读取行情数据的语句替换为预加载的数据，FactorAnalysis 调用及其之后的代码被去掉
+
+    参数:
+    notebook_path (str): notebook 路径
+
+    返回:
+    tuple: (因子定义代码, 求出因子 DataFrame 的表达式)
+    """
+    with open(notebook_path, encoding="utf-8") as f:
+        notebook = json.load(f)
+
+    source = "\n".join("".join(cell["source"]) for cell in notebook["cells"] if cell["cell_type"] == "code")
+    # 去掉 IPython 魔法命令和 shell 命令
+    source = "\n".join(line for line in source.splitlines() if not line.lstrip().startswith(("%", "!")))
+    tree = ast.parse(source)
+
+    statements = []
+    factors_expr = "factors"
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module and node.module.split(".")[0] == "factor_analysis":
+            continue
+
+        # 以 FactorAnalysis(factors, data) 的第一个参数作为因子，之后的分析代码不再执行
+        calls = [n for n in ast.walk(node) if _is_call_to(n, "FactorAnalysis")]
+        if calls:
+            factors_args = calls[0].args[:1] + [kw.value for kw in calls[0].keywords if kw.arg == "factors"]
+            if not factors_args:
+                raise ValueError("无法从 FactorAnalysis 调用中找到因子参数")
+            factors_expr = ast.get_source_segment(source, factors_args[0])
+            break
+
+        if isinstance(node, ast.Assign) and _is_call_to(node.value, "read_parquet"):
+            targets = " = ".join(ast.get_source_segment(source, target) for target in node.targets)
+            statements.append(f"{targets} = __market_data__")
+        else:
+            statements.append(ast.get_source_segment(source, node))
+
+    return "\n".join(statements), factors_expr
+
+
+def _init_worker(data_path):
+    """
+    进程池初始化函数，每个进程只读取一次行情数据
+    """
+    global _market_data
+    _market_data = pl.read_parquet(data_path)
+
+
+def run_notebook(notebook_path, code, factors_expr, factor_key, metrics_key, cache_dir, commission, periods_per_year):
+    """
+    在工作进程中计算单个 notebook 的因子及回测指标，已缓存的结果直接读取
+
+    参数:
+    notebook_path (str): notebook 路径
+    code (str): extract_factor_code 提取的因子定义代码
+    factors_expr (str): 求出因子 DataFrame 的表达式
+    factor_key (str): 因子结果的缓存键
+    metrics_key (str): 回测指标的缓存键
+    cache_dir (str): 缓存目录
+    commission (float): 交易佣金比例
+    periods_per_year (int): 每年的时间单位数
+
+    返回:
+    dict: notebook 路径、因子名称、回测指标以及是否命中缓存
+    """
+    factor_path = os.path.join(cache_dir, "factors", f"{factor_key}.parquet")
+    metrics_path = os.path.join(cache_dir, "metrics", f"{metrics_key}.json")
+
+    if os.path.exists(factor_path):
+        factors = pl.read_parquet(factor_path)
+        factor_cached = True
+    else:
+        namespace = {"__market_data__": _market_data, "__name__": "__batch_runner__"}
+        exec(compile(code, notebook_path, "exec"), namespace)
+        factors = eval(factors_expr, namespace)
+        atomic_write(factor_path, factors.write_parquet)
+        factor_cached = False
+
+    factor_name = [name for name in factors.columns if name not in ["symbol", "open_time"]][0]
+
+    if os.path.exists(metrics_path):
+        with open(metrics_path, encoding="utf-8") as f:
+            metrics = json.load(f)
+        metrics_cached = True
+    else:
+        analysis = FactorAnalysis(factors, _market_data, commission)
+        metrics = analysis.collect_metrics(periods_per_year)
+        metrics = {strategy: {k: float(v) for k, v in stats.items()} for strategy, stats in metrics.items()}
+        atomic_write(metrics_path, lambda tmp_path: _write_json(tmp_path, metrics))
+        metrics_cached = False
+
+    return {
+        "notebook": notebook_path,
+        "factor": factor_name,
+        "metrics": metrics,
+        "factor_cached": factor_cached,
+        "metrics_cached": metrics_cached
+    }
+
+
+def collect_notebooks(paths):
+    """
+    展开命令行传入的路径，目录下的所有 .ipynb 均被收集
+    """
+    notebooks = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                notebooks.extend(os.path.join(root, name) for name in files if name.endswith(".ipynb"))
+        else:
+            notebooks.append(path)
+    return sorted(notebooks)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="批量运行因子研究 notebook，重建因子库并回测")
+    parser.add_argument("notebooks", nargs="+", help="notebook 文件或目录")
+    parser.add_argument("--data", required=True, help="行情数据 parquet 文件，例如 hourly_data.pa")
+    parser.add_argument("--cache-dir", default=".factor_cache", help="因子结果和回测指标的缓存目录")
+    parser.add_argument("--output", default="factor_summary.parquet", help="汇总结果输出路径")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="工作进程数")
+    parser.add_argument("--commission", type=float, default=0.25 / 10000.0, help="交易佣金比例")
+    parser.add_argument("--periods-per-year", type=int, default=365 * 24, help="每年的时间单位数，日频为 365")
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.join(args.cache_dir, "factors"), exist_ok=True)
+    os.makedirs(os.path.join(args.cache_dir, "metrics"), exist_ok=True)
+
+    # 缓存键由代码、参数和数据共同决定，只有发生变化的因子才会重新计算
+    data_hash = file_hash(args.data)
+    backtest_hash = file_hash(os.path.join(BACKTEST_DIR, "factor_analysis.py"))
+
+    results = []
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(args.data,)) as executor:
+        futures = {}
+        for notebook_path in collect_notebooks(args.notebooks):
+            try:
+                code, factors_expr = extract_factor_code(notebook_path)
+            except Exception as e:
+                print(f"[失败] {notebook_path}: {e!r}")
+                continue
+            factor_key = make_key(code, factors_expr, data_hash)
+            metrics_key = make_key(factor_key, backtest_hash, args.commission, args.periods_per_year)
+            future = executor.submit(run_notebook, notebook_path, code, factors_expr, factor_key, metrics_key,
+                                     args.cache_dir, args.commission, args.periods_per_year)
+            futures[future] = notebook_path
+
+        for future in as_completed(futures):
+            notebook_path = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"[失败] {notebook_path}: {e!r}")
+                continue
+            status = "缓存" if result["metrics_cached"] else "计算"
+            print(f"[{status}] {notebook_path}: {result['factor']}")
+            results.append(result)
+
+    rows = [
+        {"notebook": result["notebook"], "factor": result["factor"], "strategy": strategy, **stats}
+        for result in results
+        for strategy, stats in result["metrics"].items()
+    ]
+    summary = pl.DataFrame(rows, schema=SUMMARY_SCHEMA).sort(["notebook", "strategy"])
+    summary.write_parquet(args.output)
+    print(f"\n共 {len(results)} 个因子完成，汇总结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()